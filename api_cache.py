@@ -1,23 +1,60 @@
-"""Cache LTA DataMall API responses to JSON files."""
+"""Cache LTA DataMall API responses to JSON files (optionally zstd-compressed)."""
 
+import hashlib
 import json
+import mmap
 import os
+import pickle
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from urllib.parse import urlencode
+
+import config
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; caches are then written uncompressed
+    zstandard = None
+
+# Suffix of zstd-compressed cache files, appended to the .json name
+ZSTD_SUFFIX = ".zst"
+
+# Suffix of the small metadata sidecar written next to each cache
+META_SUFFIX = ".meta.json"
+
+# Subdirectory of the cache directory holding HTTPCache page responses
+HTTP_CACHE_SUBDIR = "http"
 
 
 class APICache:
     """Cache for storing and loading API responses."""
 
-    def __init__(self, cache_dir: str = "api_cache"):
+    def __init__(self, cache_dir: str = "api_cache", compress: bool = None):
         """Initialize the API cache.
 
         Args:
             cache_dir: Directory to store cached API responses
+            compress: If True, save caches as zstd-compressed JSON
+                (<name>.json.zst). Defaults to config.CACHE_COMPRESS.
+                Requires the zstandard package.
         """
         self.cache_dir = cache_dir
         os.makedirs(cache_dir, exist_ok=True)
 
+        if compress is None:
+            compress = config.CACHE_COMPRESS
+        if compress and zstandard is None:
+            print("  zstandard is not installed, writing uncompressed cache files")
+            compress = False
+        self.compress = compress
+
     def _get_cache_filepath(self, cache_name: str) -> str:
         """Get the filepath for a cache file.
 
@@ -29,17 +66,154 @@ class APICache:
         """
         return os.path.join(self.cache_dir, f"{cache_name}.json")
 
-    def save(self, cache_name: str, data: List[Dict[str, Any]]) -> str:
+    def _find_cache_file(self, cache_name: str) -> str:
+        """Find the cache file to read, compressed or plain.
+
+        When both <name>.json and <name>.json.zst exist, the newer one wins.
+        If neither exists the plain JSON path is returned, so callers can
+        report it as missing. Compressed files are ignored when zstandard
+        is not installed.
+
+        Args:
+            cache_name: Name of the cache (e.g., 'bus_stops')
+
+        Returns:
+            Full path to the cache file
+        """
+        filepath = self._get_cache_filepath(cache_name)
+        zst_path = filepath + ZSTD_SUFFIX
+
+        if zstandard is None or not os.path.exists(zst_path):
+            return filepath
+        if os.path.exists(filepath) and os.path.getmtime(filepath) > os.path.getmtime(zst_path):
+            return filepath
+        return zst_path
+
+    def _get_pickle_filepath(self, cache_name: str) -> str:
+        """Get the filepath for a cache's pickle sidecar.
+
+        Args:
+            cache_name: Name of the cache (e.g., 'bus_stops')
+
+        Returns:
+            Full path to the pickle sidecar file
+        """
+        return os.path.join(self.cache_dir, f"{cache_name}.pkl")
+
+    def _get_meta_filepath(self, cache_name: str) -> str:
+        """Get the filepath for a cache's metadata sidecar.
+
+        Args:
+            cache_name: Name of the cache (e.g., 'bus_stops')
+
+        Returns:
+            Full path to the metadata sidecar file
+        """
+        return os.path.join(self.cache_dir, f"{cache_name}{META_SUFFIX}")
+
+    def _load_cache_meta(self, cache_name: str) -> Dict[str, Any]:
+        """Load a cache's timestamp and record count without parsing its data.
+
+        Reads the <name>.meta.json sidecar when it is at least as new as the
+        cache file. Caches saved before sidecars existed (or edited by hand)
+        fall back to parsing the full cache.
+
+        Args:
+            cache_name: Name of the cache (e.g., 'bus_stops')
+
+        Returns:
+            Dictionary with 'timestamp' and 'record_count'
+        """
+        filepath = self._find_cache_file(cache_name)
+        meta_path = self._get_meta_filepath(cache_name)
+
+        if (os.path.exists(meta_path) and
+                os.path.getmtime(meta_path) >= os.path.getmtime(filepath)):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                return {"timestamp": meta["timestamp"], "record_count": meta["record_count"]}
+            except (OSError, ValueError, KeyError) as e:
+                print(f"  Ignoring unreadable cache metadata {meta_path}: {e}")
+
+        return self._load_cache_data(cache_name)
+
+    def _load_cache_data(self, cache_name: str) -> Dict[str, Any]:
+        """Load a cache's metadata + data dictionary, preferring the pickle sidecar.
+
+        The pickle is only used when it is at least as new as the cache file,
+        so a JSON cache edited or replaced by hand is never shadowed by a
+        stale pickle. An unreadable pickle falls back to the cache file.
+
+        Args:
+            cache_name: Name of the cache (e.g., 'bus_stops')
+
+        Returns:
+            Parsed cache dictionary
+        """
+        filepath = self._find_cache_file(cache_name)
+        pickle_path = self._get_pickle_filepath(cache_name)
+
+        if (os.path.exists(pickle_path) and
+                os.path.getmtime(pickle_path) >= os.path.getmtime(filepath)):
+            try:
+                with open(pickle_path, 'rb') as f:
+                    return pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError) as e:
+                print(f"  Ignoring unreadable pickle cache {pickle_path}: {e}")
+
+        return self._read_cache_file(filepath)
+
+    def _read_cache_file(self, filepath: str) -> Dict[str, Any]:
+        """Parse a cache file into its metadata + data dictionary.
+
+        With orjson the file is memory-mapped and parsed in place, which
+        avoids copying the whole file into a Python bytes object first.
+        Compressed (.zst) files are decompressed in memory and then parsed.
+
+        Args:
+            filepath: Path to the cache file
+
+        Returns:
+            Parsed cache dictionary
+        """
+        if filepath.endswith(ZSTD_SUFFIX):
+            with open(filepath, 'rb') as f:
+                with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                    data_bytes = reader.read()
+            return orjson.loads(data_bytes) if orjson is not None else json.loads(data_bytes)
+
+        if orjson is not None:
+            with open(filepath, 'rb') as f:
+                # mmap cannot map an empty file; let orjson report the error
+                if os.fstat(f.fileno()).st_size == 0:
+                    return orjson.loads(b"")
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    with memoryview(mm) as view:
+                        return orjson.loads(view)
+
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, cache_name: str, data: List[Dict[str, Any]], pretty: bool = False) -> str:
         """Save data to cache file.
 
+        Cache files are written as compact JSON by default since they are
+        only read back by machines; pass pretty=True for indented output
+        when inspecting a cache by hand. With compression enabled the
+        encoded JSON is zstd-compressed into <name>.json.zst instead.
+
         Args:
             cache_name: Name of the cache (e.g., 'bus_stops')
             data: Data to cache
+            pretty: If True, indent the JSON output for readability
 
         Returns:
             Path to the saved cache file
         """
         filepath = self._get_cache_filepath(cache_name)
+        if self.compress:
+            filepath += ZSTD_SUFFIX
 
         cache_data = {
             "timestamp": datetime.now().isoformat(),
@@ -47,8 +221,49 @@ class APICache:
             "data": data
         }
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, indent=2, ensure_ascii=False)
+        # Encode the whole payload up front and hand it to a large buffered
+        # writer, so a multi-MB cache is flushed in a few write() calls.
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            data_bytes = orjson.dumps(cache_data, option=option)
+        else:
+            if pretty:
+                text = json.dumps(cache_data, indent=2, ensure_ascii=False)
+            else:
+                text = json.dumps(cache_data, separators=(',', ':'), ensure_ascii=False)
+            data_bytes = text.encode('utf-8')
+
+        if self.compress:
+            data_bytes = zstandard.ZstdCompressor(level=3).compress(data_bytes)
+
+        # Write to a temporary file and swap it in, so an interrupted save
+        # never leaves a truncated cache behind for the next --use-cache run
+        tmp_path = f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb', buffering=config.IO_BUFFER_SIZE) as f:
+            f.write(data_bytes)
+        os.replace(tmp_path, filepath)
+
+        # Without orjson, also write a pickle sidecar: unpickling is roughly
+        # twice as fast as the stdlib JSON parser (orjson on the mmapped file
+        # is already on par). The JSON stays the canonical, human-readable
+        # copy for inspection and external tools.
+        if orjson is None:
+            pickle_path = self._get_pickle_filepath(cache_name)
+            with open(f"{pickle_path}.{os.getpid()}.tmp", 'wb',
+                      buffering=config.IO_BUFFER_SIZE) as f:
+                pickle.dump(cache_data, f, protocol=5)
+            os.replace(f.name, pickle_path)
+
+        # Header fields only, so get_cache_info never has to parse the data
+        meta_path = self._get_meta_filepath(cache_name)
+        with open(f"{meta_path}.{os.getpid()}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({
+                "timestamp": cache_data["timestamp"],
+                "record_count": cache_data["record_count"]
+            }, f)
+        os.replace(f.name, meta_path)
 
         print(f"  Saved {len(data)} records to {filepath}")
         return filepath
@@ -65,13 +280,12 @@ class APICache:
         Raises:
             FileNotFoundError: If cache file doesn't exist
         """
-        filepath = self._get_cache_filepath(cache_name)
+        filepath = self._find_cache_file(cache_name)
 
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"Cache file not found: {filepath}")
 
-        with open(filepath, 'r', encoding='utf-8') as f:
-            cache_data = json.load(f)
+        cache_data = self._load_cache_data(cache_name)
 
         print(f"  Loaded {cache_data['record_count']} records from {filepath}")
         print(f"  Cache timestamp: {cache_data['timestamp']}")
@@ -87,9 +301,26 @@ class APICache:
         Returns:
             True if cache exists, False otherwise
         """
-        filepath = self._get_cache_filepath(cache_name)
+        filepath = self._find_cache_file(cache_name)
         return os.path.exists(filepath)
 
+    def is_fresh(self, cache_name: str, ttl_seconds: Optional[float]) -> bool:
+        """Check if a cache file exists and is younger than a time-to-live.
+
+        Args:
+            cache_name: Name of the cache
+            ttl_seconds: Maximum age in seconds, or None for no expiry
+
+        Returns:
+            True if the cache exists and has not expired, False otherwise
+        """
+        filepath = self._find_cache_file(cache_name)
+        if not os.path.exists(filepath):
+            return False
+        if ttl_seconds is None:
+            return True
+        return os.path.getmtime(filepath) > time.time() - ttl_seconds
+
     def get_cache_info(self, cache_name: str) -> Dict[str, Any]:
         """Get information about a cache file.
 
@@ -102,13 +333,12 @@ class APICache:
         Raises:
             FileNotFoundError: If cache file doesn't exist
         """
-        filepath = self._get_cache_filepath(cache_name)
+        filepath = self._find_cache_file(cache_name)
 
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"Cache file not found: {filepath}")
 
-        with open(filepath, 'r', encoding='utf-8') as f:
-            cache_data = json.load(f)
+        cache_data = self._load_cache_meta(cache_name)
 
         file_size = os.path.getsize(filepath)
 
@@ -121,6 +351,34 @@ class APICache:
             "file_size_mb": round(file_size / (1024 * 1024), 2)
         }
 
+    def get_sidecar_usage(self) -> Dict[str, Any]:
+        """Get the disk usage of files kept alongside the cache files.
+
+        Covers the .pkl and .meta.json sidecars written by save() and the
+        HTTPCache entries in the http subdirectory.
+
+        Returns:
+            Dictionary with sidecar_bytes, http_entries and http_bytes
+        """
+        usage = {"sidecar_bytes": 0, "http_entries": 0, "http_bytes": 0}
+        if not os.path.exists(self.cache_dir):
+            return usage
+
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(('.pkl', META_SUFFIX)):
+                    usage["sidecar_bytes"] += entry.stat().st_size
+
+        http_dir = os.path.join(self.cache_dir, HTTP_CACHE_SUBDIR)
+        if os.path.isdir(http_dir):
+            with os.scandir(http_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith('.bin'):
+                        usage["http_entries"] += 1
+                        usage["http_bytes"] += entry.stat().st_size
+
+        return usage
+
     def list_caches(self) -> List[str]:
         """List all available caches.
 
@@ -130,5 +388,117 @@ class APICache:
         if not os.path.exists(self.cache_dir):
             return []
 
-        cache_files = [f for f in os.listdir(self.cache_dir) if f.endswith('.json')]
-        return [f.replace('.json', '') for f in cache_files]
+        names = set()
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                f = entry.name
+                if f.endswith(META_SUFFIX) or not entry.is_file():
+                    continue
+                if f.endswith('.json'):
+                    names.add(f[:-len('.json')])
+                elif f.endswith('.json' + ZSTD_SUFFIX):
+                    names.add(f[:-len('.json' + ZSTD_SUFFIX)])
+        return sorted(names)
+
+
+class HTTPCache:
+    """Per-request cache of API responses for conditional revalidation.
+
+    Each response that carries an ETag or Last-Modified header is stored
+    as one file under <cache_dir>/http: a JSON line with the validators,
+    followed by the raw response body. Later requests for the same URL and
+    query send If-None-Match / If-Modified-Since, and a 304 reply is served
+    from the stored body. Files are replaced atomically, so concurrent
+    requests for different pages never see a half-written entry.
+    """
+
+    def __init__(self, cache_dir: str = "api_cache"):
+        """Initialize the HTTP cache.
+
+        Args:
+            cache_dir: Cache directory; entries go in its http subdirectory
+        """
+        self.http_dir = os.path.join(cache_dir, HTTP_CACHE_SUBDIR)
+        os.makedirs(self.http_dir, exist_ok=True)
+
+    def _get_entry_filepath(self, url: str, params: Optional[Dict] = None) -> str:
+        """Get the filepath of the entry for a request.
+
+        Args:
+            url: Request URL
+            params: Query parameters
+
+        Returns:
+            Full path to the entry file
+        """
+        key = url
+        if params:
+            key += "?" + urlencode(sorted(params.items()))
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.http_dir, f"{digest}.bin")
+
+    def conditional_headers(self, url: str, params: Optional[Dict] = None) -> Dict[str, str]:
+        """Get revalidation headers for a request, if a response is stored.
+
+        Args:
+            url: Request URL
+            params: Query parameters
+
+        Returns:
+            If-None-Match / If-Modified-Since headers (empty if not cached)
+        """
+        try:
+            with open(self._get_entry_filepath(url, params), 'rb') as f:
+                validators = json.loads(f.readline())
+        except (OSError, ValueError):
+            return {}
+
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def load_body(self, url: str, params: Optional[Dict] = None) -> bytes:
+        """Load the stored response body for a request.
+
+        Args:
+            url: Request URL
+            params: Query parameters
+
+        Returns:
+            Raw response body
+
+        Raises:
+            FileNotFoundError: If no response is stored for the request
+        """
+        with open(self._get_entry_filepath(url, params), 'rb') as f:
+            f.readline()
+            return f.read()
+
+    def store(self, url: str, params: Optional[Dict], headers: Dict[str, str], body: bytes) -> bool:
+        """Store a response if it carries validators.
+
+        Args:
+            url: Request URL
+            params: Query parameters
+            headers: Response headers
+            body: Raw response body
+
+        Returns:
+            True if the response was stored
+        """
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return False
+
+        filepath = self._get_entry_filepath(url, params)
+        tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        validators = json.dumps({"etag": etag, "last_modified": last_modified})
+        with open(tmp_path, 'wb', buffering=config.IO_BUFFER_SIZE) as f:
+            f.write(validators.encode('utf-8') + b"\n")
+            f.write(body)
+        os.replace(tmp_path, filepath)
+        return True
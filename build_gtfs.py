@@ -31,7 +31,14 @@ def main():
     parser.add_argument(
         "--use-cache",
         action="store_true",
-        help="Load data from cache instead of making API calls"
+        help="Load data from cache instead of making API calls "
+             "(the API is only called for datasets with no cache file)"
+    )
+    parser.add_argument(
+        "--refresh-stale",
+        action="store_true",
+        help="With --use-cache, refetch caches older than config.CACHE_TTL_SECONDS "
+             "and overwrite them (requires an API key)"
     )
     parser.add_argument(
         "--cache-dir",
@@ -58,6 +65,8 @@ def main():
     print(f"Output Directory: {args.output_dir}")
     if args.use_cache:
         print(f"Mode: Loading from cache ({args.cache_dir})")
+        if args.refresh_stale:
+            print("      Refreshing caches older than their TTL from the API")
     elif args.save_cache:
         print(f"Mode: Fetching from API and saving to cache ({args.cache_dir})")
     else:
@@ -65,22 +74,23 @@ def main():
     print("=" * 60)
 
     try:
-        # Initialize client
-        client = LTADataMallClient(
-            api_key=args.api_key,
-            use_cache=args.use_cache,
-            cache_dir=args.cache_dir
-        )
-
         # Fetch data from LTA DataMall API or cache
         if args.use_cache:
             print("\n💾 Loading data from cache...")
         else:
             print("\n📡 Fetching data from LTA DataMall API...")
 
-        bus_stops = client.get_bus_stops(save_cache=args.save_cache)
-        bus_services = client.get_bus_services(save_cache=args.save_cache)
-        bus_routes = client.get_bus_routes(save_cache=args.save_cache)
+        with LTADataMallClient(
+            api_key=args.api_key,
+            use_cache=args.use_cache,
+            cache_dir=args.cache_dir,
+            refresh_stale=args.refresh_stale
+        ) as client:
+            data = client.get_all(save_cache=args.save_cache)
+
+        bus_stops = data["bus_stops"]
+        bus_services = data["bus_services"]
+        bus_routes = data["bus_routes"]
 
         # Validate data
         if not bus_stops:
@@ -128,13 +138,18 @@ def main():
                 print("\n❌ Basic structure validation failed")
                 sys.exit(1)
 
+            # Canonical validator, started first so the JVM runs alongside
+            # the gtfs-kit checks
+            canonical_run = None
+            if args.run_canonical_validator:
+                canonical_run = validator.start_canonical_validator(country_code="sg")
+
             # gtfs-kit validation
             validator.validate_with_gtfs_kit()
 
-            # Canonical validator
             canonical_passed = True
             if args.run_canonical_validator:
-                canonical_passed = validator.run_canonical_validator(country_code="sg")
+                canonical_passed = validator.finish_canonical_validator(canonical_run)
 
             # Print summary and check for errors
             validation_passed = validator.print_summary()
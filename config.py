@@ -13,6 +13,24 @@ ENDPOINTS = {
     "bus_routes": f"{LTA_BASE_URL}/BusRoutes"
 }
 
+# Cache freshness: maximum age in seconds before --refresh-stale refetches a
+# cached dataset (only when an API key is available). None disables expiry for
+# that dataset. Plain --use-cache runs never expire caches.
+CACHE_TTL_SECONDS = {
+    "bus_stops": 30 * 86400,     # Bus stops rarely change
+    "bus_services": 7 * 86400,
+    "bus_routes": 7 * 86400      # Routes are revised roughly monthly
+}
+
+# Keep a copy of each API response that carries an ETag/Last-Modified header
+# under <cache_dir>/http and revalidate it with a conditional request next time,
+# so unchanged pages come back as bodiless 304 replies. Off by default: it
+# writes every page to disk on each API run, including runs without caching.
+HTTP_REVALIDATE = False
+
+# Write API caches as zstd-compressed JSON (<name>.json.zst); requires zstandard
+CACHE_COMPRESS = False
+
 # GTFS Configuration
 GTFS_OUTPUT_DIR = "gtfs_output"
 AGENCY_NAME = "Land Transport Authority"
@@ -22,3 +40,21 @@ AGENCY_LANG = "en"
 
 # Pagination
 RECORDS_PER_PAGE = 500
+MAX_CONCURRENT_REQUESTS = 4  # Pages of one endpoint requested in parallel
+# Ask for the OData record count ($count=true) with the first page so the
+# remaining pages can be scheduled without probing for the end. DataMall does
+# not document $count; enable only if the endpoints return @odata.count.
+REQUEST_RECORD_COUNT = False
+
+# Rate limiting: token bucket shared by all requests of one client
+REQUESTS_PER_SECOND = 2.0  # Sustained request rate (0 disables limiting)
+REQUEST_BURST = MAX_CONCURRENT_REQUESTS  # Requests that may start back to back after idling
+
+# Retries for throttled (429) and transient gateway (502/503/504) responses.
+# A Retry-After header from the server takes precedence over the backoff,
+# which otherwise doubles from RETRY_BACKOFF_FACTOR seconds per attempt.
+MAX_REQUEST_RETRIES = 5
+RETRY_BACKOFF_FACTOR = 0.5
+
+# File I/O
+IO_BUFFER_SIZE = 1 << 20  # 1 MiB write buffer for cache and GTFS output files
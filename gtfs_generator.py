@@ -3,10 +3,103 @@
 import os
 import csv
 import math
-from typing import List, Dict, Any, Tuple
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
+from typing import List, Dict, Any, Iterator, TextIO, Tuple
 from datetime import datetime, date
+import numpy as np
 import config
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the NumPy implementation is used instead
+    njit = None
+
+# HH:MM:00 strings indexed by minute since midnight. GTFS times may run past
+# 24:00:00 for trips after midnight, so cover two service days.
+_TIME_STRINGS = tuple(f"{m // 60:02d}:{m % 60:02d}:00" for m in range(48 * 60))
+
+
+def _stop_minutes_kernel(
+    lats: np.ndarray,
+    lons: np.ndarray,
+    average_speed_kmh: float,
+    dwell_time_minutes: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Loop form of GTFSGenerator._calculate_stop_minutes, compiled by Numba.
+
+    Args:
+        lats, lons: Stop coordinates in sequence order (NaN if unknown)
+        average_speed_kmh: Average bus speed in km/h
+        dwell_time_minutes: Dwell time at each stop in minutes
+
+    Returns:
+        Tuple of (arrival_minutes, departure_minutes) integer arrays
+    """
+    R = 6371  # Earth's radius in kilometers
+
+    n = lats.shape[0]
+    arrival_minutes = np.empty(n, dtype=np.int64)
+    departure_minutes = np.empty(n, dtype=np.int64)
+    cumulative_time_minutes = 0.0
+
+    for idx in range(n):
+        if idx > 0:
+            lat1, lon1 = lats[idx - 1], lons[idx - 1]
+            lat2, lon2 = lats[idx], lons[idx]
+
+            if math.isnan(lat1) or math.isnan(lat2):
+                # Fallback if coordinates not found
+                cumulative_time_minutes += 2.0
+            else:
+                dlat = math.radians(lat2 - lat1)
+                dlon = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+                distance_km = R * math.sqrt(dlat * dlat + dlon * dlon)
+
+                travel_time_minutes = (distance_km / average_speed_kmh) * 60
+                cumulative_time_minutes += max(travel_time_minutes, 1.0)
+
+        arrival_minutes[idx] = int(cumulative_time_minutes)
+        departure_minutes[idx] = int(cumulative_time_minutes + dwell_time_minutes)
+        cumulative_time_minutes += dwell_time_minutes
+
+    return arrival_minutes, departure_minutes
+
+
+if njit is not None:
+    _stop_minutes_kernel = njit(cache=True)(_stop_minutes_kernel)
+
+
+def _needs_csv_quoting(text: str) -> bool:
+    """Check whether csv.writer would quote a field containing this text.
+
+    Args:
+        text: Field text (or several fields concatenated)
+
+    Returns:
+        True if the text contains a delimiter, quote or line break
+    """
+    return any(c in text for c in ',"\r\n')
+
+
+def _csv_line(fields: List[Any]) -> str:
+    """Format one CSV record the way csv.writer does (minimal quoting, CRLF).
+
+    Args:
+        fields: Field values for the record
+
+    Returns:
+        The record as a CSV line including its line terminator
+    """
+    out = []
+    for field in fields:
+        text = str(field)
+        if _needs_csv_quoting(text):
+            text = '"' + text.replace('"', '""') + '"'
+        out.append(text)
+    return ",".join(out) + "\r\n"
+
 
 class GTFSGenerator:
     """Generator for GTFS feed files from LTA DataMall data."""
@@ -20,44 +113,176 @@ class GTFSGenerator:
         self.output_dir = output_dir or config.GTFS_OUTPUT_DIR
         os.makedirs(self.output_dir, exist_ok=True)
 
-        # Cache for stop coordinates lookup
-        self.stop_coordinates = {}
+        # Stop coordinates lookup, stored as parallel arrays (filled in by
+        # generate_stops_txt). The trailing NaN entry is a sentinel so that
+        # index -1 gathers NaN for unknown stop codes.
+        self._stop_index: Dict[str, int] = {}
+        self._stop_lats = np.array([np.nan])
+        self._stop_lons = np.array([np.nan])
+
+    def _equirectangular_array(
+        self,
+        lats1: np.ndarray,
+        lons1: np.ndarray,
+        lats2: np.ndarray,
+        lons2: np.ndarray
+    ) -> np.ndarray:
+        """Equirectangular (flat-earth) distance between arrays of points in kilometers.
 
-    def _haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calculate distance between two points in kilometers using Haversine formula.
+        Between consecutive bus stops a few hundred metres apart this agrees
+        with the Haversine great-circle distance to well under 0.1%, using
+        one cosine per pair instead of the full set of Haversine trig calls.
 
         Args:
-            lat1, lon1: Coordinates of first point
-            lat2, lon2: Coordinates of second point
+            lats1, lons1: Coordinates of the first points
+            lats2, lons2: Coordinates of the second points
 
         Returns:
-            Distance in kilometers
+            Array of distances in kilometers (NaN where a coordinate is NaN)
         """
         R = 6371  # Earth's radius in kilometers
 
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
+        dlat = np.radians(lats2 - lats1)
+        dlon = np.radians(lons2 - lons1) * np.cos(np.radians((lats1 + lats2) / 2))
+
+        return R * np.sqrt(dlat * dlat + dlon * dlon)
+
+    def _resolve_stop_indices(self, routes: List[Dict[str, Any]]) -> np.ndarray:
+        """Map each route row's BusStopCode to its coordinate array row.
+
+        Args:
+            routes: Bus route dictionaries
+
+        Returns:
+            Integer array aligned with routes; -1 where the stop is unknown
+        """
+        stop_index = self._stop_index
+        return np.fromiter(
+            (stop_index.get(route["BusStopCode"], -1) for route in routes),
+            dtype=np.intp,
+            count=len(routes)
+        )
+
+    def _calculate_stop_minutes(
+        self,
+        stop_idx: np.ndarray,
+        average_speed_kmh: float,
+        dwell_time_minutes: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Calculate arrival and departure minutes for every stop of a trip.
+
+        Travel time between consecutive stops is derived from the
+        equirectangular distance at the average speed, with a minimum of
+        1 minute, or a 2 minute fallback when either stop has no known
+        coordinates. Each stop then adds the dwell time before the bus
+        departs.
+
+        Args:
+            stop_idx: Coordinate array rows of the trip's stops in sequence
+                order (see _resolve_stop_indices); -1 for unknown stops
+            average_speed_kmh: Average bus speed in km/h
+            dwell_time_minutes: Dwell time at each stop in minutes
+
+        Returns:
+            Tuple of (arrival_minutes, departure_minutes) integer arrays,
+            measured from the start of the trip
+        """
+        # Gather coordinates in one step; unknown stops hit the NaN sentinel
+        lats = self._stop_lats[stop_idx]
+        lons = self._stop_lons[stop_idx]
+
+        # With Numba installed, run the compiled loop instead of the array version
+        if njit is not None:
+            return _stop_minutes_kernel(
+                lats, lons, float(average_speed_kmh), float(dwell_time_minutes)
+            )
+
+        # Distance in km between each pair of consecutive stops
+        distances_km = self._equirectangular_array(lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+        # Travel time in minutes, at least 1 minute; 2 minutes if coordinates are unknown
+        travel_minutes = np.where(
+            np.isnan(distances_km),
+            2.0,
+            np.maximum((distances_km / average_speed_kmh) * 60, 1.0)
+        )
+
+        # Interleave [0, dwell, travel_1, dwell, travel_2, dwell, ...] so one
+        # running sum yields the arrival (even) and departure (odd) times in
+        # the same order the clock is advanced stop by stop.
+        steps = np.empty(2 * len(stop_idx), dtype=np.float64)
+        steps[0] = 0.0
+        steps[1::2] = dwell_time_minutes
+        steps[2::2] = travel_minutes
+        cumulative_minutes = np.cumsum(steps)
+
+        arrival_minutes = cumulative_minutes[0::2].astype(np.int64)
+        departure_minutes = cumulative_minutes[1::2].astype(np.int64)
+
+        return arrival_minutes, departure_minutes
+
+    @contextmanager
+    def _open_output(self, filename: str) -> Iterator[TextIO]:
+        """Open an output file for writing with a large write buffer.
+
+        The buffer (config.IO_BUFFER_SIZE) keeps per-row writes in
+        userspace until it fills.
+
+        Args:
+            filename: Name of the file in the output directory
+
+        Yields:
+            The open text file; it is closed on exit
+        """
+        filepath = os.path.join(self.output_dir, filename)
+        with open(
+            filepath, 'w', newline='', encoding='utf-8', buffering=config.IO_BUFFER_SIZE
+        ) as f:
+            yield f
 
-        a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
-        c = 2 * math.asin(math.sqrt(a))
+    @contextmanager
+    def _open_csv(self, filename: str, headers: List[str]) -> Iterator[Any]:
+        """Open a CSV file for incremental writing and emit its header row.
 
-        return R * c
+        Args:
+            filename: Name of the CSV file
+            headers: List of column headers
+
+        Yields:
+            csv.writer for the data rows; the file is closed on exit
+        """
+        with self._open_output(filename) as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            yield writer
 
     def _write_csv(self, filename: str, headers: List[str], rows: List[List[Any]]):
         """Write data to a CSV file.
 
+        Args:
+            filename: Name of the CSV file
+            headers: List of column headers
+            rows: List of data rows
+        """
+        with self._open_csv(filename, headers) as writer:
+            writer.writerows(rows)
+        print(f"  Created {filename} with {len(rows)} rows")
+
+    def _write_small_csv(self, filename: str, headers: List[str], rows: List[List[Any]]):
+        """Write a tiny CSV file (a header and a few rows) in a single write.
+
+        Used for the fixed single-row tables, where the csv.writer setup
+        costs more than formatting the handful of lines directly.
+
         Args:
             filename: Name of the CSV file
             headers: List of column headers
             rows: List of data rows
         """
         filepath = os.path.join(self.output_dir, filename)
+        content = _csv_line(headers) + "".join(_csv_line(row) for row in rows)
         with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(headers)
-            writer.writerows(rows)
+            f.write(content)
         print(f"  Created {filename} with {len(rows)} rows")
 
     def generate_agency_txt(self):
@@ -71,7 +296,7 @@ class GTFSGenerator:
             config.AGENCY_TIMEZONE,
             config.AGENCY_LANG
         ]]
-        self._write_csv("agency.txt", headers, rows)
+        self._write_small_csv("agency.txt", headers, rows)
 
     def generate_stops_txt(self, bus_stops: List[Dict[str, Any]]):
         """Generate stops.txt from bus stops data.
@@ -82,20 +307,34 @@ class GTFSGenerator:
         print("\nGenerating stops.txt...")
         headers = ["stop_id", "stop_code", "stop_name", "stop_desc", "stop_lat", "stop_lon"]
         rows = []
+        stop_lats = []
+        stop_lons = []
+
+        # Fetch the three required fields with one C-level call per stop
+        get_location = itemgetter("BusStopCode", "Latitude", "Longitude")
 
-        # Build stop coordinates cache for distance calculations
         for stop in bus_stops:
-            stop_code = stop["BusStopCode"]
-            self.stop_coordinates[stop_code] = (stop["Latitude"], stop["Longitude"])
+            stop_code, lat, lon = get_location(stop)
 
             rows.append([
                 stop_code,
                 stop_code,
                 stop.get("Description", f"Bus Stop {stop_code}"),
                 stop.get("RoadName", ""),
-                stop["Latitude"],
-                stop["Longitude"]
+                lat,
+                lon
             ])
+            stop_lats.append(lat)
+            stop_lons.append(lon)
+
+        # Build stop coordinates lookup for distance calculations. Arrays get
+        # one extra NaN slot at the end, addressed by index -1 for unknown stops.
+        n = len(rows)
+        self._stop_index = {row[0]: i for i, row in enumerate(rows)}
+        self._stop_lats = np.full(n + 1, np.nan)
+        self._stop_lats[:n] = stop_lats
+        self._stop_lons = np.full(n + 1, np.nan)
+        self._stop_lons[:n] = stop_lons
 
         self._write_csv("stops.txt", headers, rows)
 
@@ -107,26 +346,24 @@ class GTFSGenerator:
         """
         print("\nGenerating routes.txt...")
         headers = ["route_id", "agency_id", "route_short_name", "route_long_name", "route_type"]
-        rows = []
 
-        # Deduplicate routes - only one route per service number
-        seen_routes = set()
+        # Deduplicate routes - only one route per service number. LTA lists
+        # each service once per direction; the first entry seen is kept.
+        unique_services = {}
         for service in bus_services:
-            route_id = service["ServiceNo"]
-            # route_type = 3 for bus (GTFS standard)
-
-            # Skip if we've already added this route
-            if route_id in seen_routes:
-                continue
+            unique_services.setdefault(service["ServiceNo"], service)
 
-            seen_routes.add(route_id)
-            rows.append([
+        # route_type = 3 for bus (GTFS standard)
+        rows = [
+            [
                 route_id,
                 "LTA",
-                service["ServiceNo"],
-                f"Bus {service['ServiceNo']} ({service.get('Operator', 'LTA')})",
+                route_id,
+                f"Bus {route_id} ({service.get('Operator', 'LTA')})",
                 "3"  # Bus
-            ])
+            ]
+            for route_id, service in unique_services.items()
+        ]
 
         self._write_csv("routes.txt", headers, rows)
 
@@ -140,125 +377,142 @@ class GTFSGenerator:
         Args:
             bus_routes: List of bus route dictionaries from LTA API
             bus_services: List of bus service dictionaries from LTA API
+                (not currently used for trips; kept for a stable signature)
         """
         print("\nGenerating trips.txt and stop_times.txt...")
 
-        # Group routes by ServiceNo and Direction
-        routes_by_service = {}
-        for route in bus_routes:
-            key = (route["ServiceNo"], route["Direction"])
-            if key not in routes_by_service:
-                routes_by_service[key] = []
-            routes_by_service[key].append(route)
-
-        # Sort stops by StopSequence within each route
-        for key in routes_by_service:
-            routes_by_service[key].sort(key=lambda x: x["StopSequence"])
+        # Sort once by service, direction and stop sequence, then group the
+        # consecutive runs into one ordered stop list per (ServiceNo, Direction)
+        sorted_routes = sorted(
+            bus_routes, key=itemgetter("ServiceNo", "Direction", "StopSequence")
+        )
+        routes_by_service = {
+            key: list(group)
+            for key, group in groupby(sorted_routes, key=itemgetter("ServiceNo", "Direction"))
+        }
+
+        # Resolve every stop code to a coordinate row once, in the same order;
+        # each trip then takes a contiguous slice of this array
+        route_stop_idx = self._resolve_stop_indices(sorted_routes)
+        offset = 0
 
         # Generate trips
         trip_headers = ["route_id", "service_id", "trip_id", "trip_headsign", "direction_id"]
-        trip_rows = []
 
         # Generate stop_times
         stop_time_headers = [
             "trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"
         ]
-        stop_time_rows = []
-
-        # Create service calendar lookup
-        service_info = {s["ServiceNo"]: s for s in bus_services}
-
-        for (service_no, direction), stops in routes_by_service.items():
-            # Create trip ID
-            trip_id = f"{service_no}_{direction}"
-
-            # Get headsign (destination)
-            service_data = service_info.get(service_no, {})
-            if direction == 1:
-                headsign = f"To {stops[-1]['BusStopCode']}"
-            else:
-                headsign = f"To {stops[-1]['BusStopCode']}"
-
-            # Add trip
-            # Convert LTA direction (1, 2) to GTFS direction_id (0, 1)
-            gtfs_direction_id = 0 if direction == 1 else 1
-
-            trip_rows.append([
-                service_no,
-                "DAILY",  # service_id (we'll create this in calendar.txt)
-                trip_id,
-                headsign,
-                gtfs_direction_id
-            ])
 
-            # Add stop_times for this trip
-            # Calculate times based on actual distances and realistic bus speeds
-            cumulative_time_minutes = 0
-            start_hour = 6
-            average_speed_kmh = 25  # Average bus speed in urban areas (km/h)
-            dwell_time_minutes = 1  # Stop dwell time
+        # Calculate times based on actual distances and realistic bus speeds
+        start_hour = 6
+        average_speed_kmh = 25  # Average bus speed in urban areas (km/h)
+        dwell_time_minutes = 1  # Stop dwell time
+        start_minutes = start_hour * 60
 
-            for idx, stop in enumerate(stops):
-                stop_code = stop["BusStopCode"]
+        # Convert LTA direction (1, 2) to GTFS direction_id (0, 1)
+        direction_map = {1: 0, 2: 1}
 
-                # Calculate travel time from previous stop
-                if idx > 0:
-                    prev_stop_code = stops[idx - 1]["BusStopCode"]
+        # Bind the per-trip helpers once instead of looking them up each trip
+        calculate_stop_minutes = self._calculate_stop_minutes
+        format_times = self._format_times
 
-                    # Get coordinates from cache
-                    if prev_stop_code in self.stop_coordinates and stop_code in self.stop_coordinates:
-                        prev_lat, prev_lon = self.stop_coordinates[prev_stop_code]
-                        curr_lat, curr_lon = self.stop_coordinates[stop_code]
+        # Write each trip's rows as soon as they are built instead of
+        # holding both tables in memory until the end
+        with self._open_csv("trips.txt", trip_headers) as trip_writer, \
+                self._open_output("stop_times.txt") as stop_times_file:
+            stop_times_file.write(_csv_line(stop_time_headers))
 
-                        # Calculate distance in km
-                        distance_km = self._haversine_distance(prev_lat, prev_lon, curr_lat, curr_lon)
+            for (service_no, direction), stops in routes_by_service.items():
+                # Create trip ID
+                trip_id = f"{service_no}_{direction}"
 
-                        # Calculate travel time in minutes
-                        travel_time_minutes = (distance_km / average_speed_kmh) * 60
-
-                        # Add minimum time between stops (to handle very close stops)
-                        travel_time_minutes = max(travel_time_minutes, 1.0)
-
-                        cumulative_time_minutes += travel_time_minutes
-                    else:
-                        # Fallback if coordinates not found
-                        cumulative_time_minutes += 2
-
-                # Arrival time
-                arrival_minutes = int(cumulative_time_minutes)
-                arrival_time = self._format_time(start_hour * 60 + arrival_minutes)
-
-                # Departure time (arrival + dwell time)
-                departure_minutes = int(cumulative_time_minutes + dwell_time_minutes)
-                departure_time = self._format_time(start_hour * 60 + departure_minutes)
+                # Get headsign (destination)
+                headsign = f"To {stops[-1]['BusStopCode']}"
 
-                stop_time_rows.append([
+                # Add trip
+                trip_writer.writerow([
+                    service_no,
+                    "DAILY",  # service_id (we'll create this in calendar.txt)
                     trip_id,
-                    arrival_time,
-                    departure_time,
-                    stop_code,
-                    stop["StopSequence"]
+                    headsign,
+                    direction_map.get(direction, 1)
                 ])
 
-                # Add dwell time for next calculation
-                cumulative_time_minutes += dwell_time_minutes
-
-        self._write_csv("trips.txt", trip_headers, trip_rows)
-        self._write_csv("stop_times.txt", stop_time_headers, stop_time_rows)
+                # Add stop_times for this trip
+                start = offset
+                offset += len(stops)
+                stop_idx = route_stop_idx[start:offset]
+
+                arrival_minutes, departure_minutes = calculate_stop_minutes(
+                    stop_idx,
+                    average_speed_kmh,
+                    dwell_time_minutes
+                )
+
+                arrival_times = format_times(start_minutes + arrival_minutes)
+                departure_times = format_times(start_minutes + departure_minutes)
+
+                stop_codes = [stop["BusStopCode"] for stop in stops]
+
+                # Times and sequence numbers never need CSV quoting, so the
+                # rows are formatted directly unless the trip or a stop code
+                # contains a delimiter or quote character
+                if _needs_csv_quoting(trip_id + "".join(map(str, stop_codes))):
+                    stop_times_file.write("".join([
+                        _csv_line([trip_id, arrival_time, departure_time, code, stop["StopSequence"]])
+                        for stop, code, arrival_time, departure_time in zip(
+                            stops, stop_codes, arrival_times, departure_times
+                        )
+                    ]))
+                else:
+                    stop_times_file.write("".join([
+                        f"{trip_id},{arrival_time},{departure_time},{code},{stop['StopSequence']}\r\n"
+                        for stop, code, arrival_time, departure_time in zip(
+                            stops, stop_codes, arrival_times, departure_times
+                        )
+                    ]))
+
+        print(f"  Created trips.txt with {len(routes_by_service)} rows")
+        print(f"  Created stop_times.txt with {len(sorted_routes)} rows")
 
     def _format_time(self, minutes: int) -> str:
         """Format minutes since midnight as HH:MM:SS.
 
+        Values covered by the precomputed _TIME_STRINGS table are looked up;
+        anything outside it is formatted directly.
+
         Args:
             minutes: Minutes since midnight
 
         Returns:
             Time string in HH:MM:SS format
         """
+        if 0 <= minutes < len(_TIME_STRINGS):
+            return _TIME_STRINGS[minutes]
+
         hours = minutes // 60
         mins = minutes % 60
         return f"{hours:02d}:{mins:02d}:00"
 
+    def _format_times(self, minutes: np.ndarray) -> List[str]:
+        """Format an array of minutes since midnight as HH:MM:SS strings.
+
+        Looks each value up in the precomputed _TIME_STRINGS table; values
+        outside the table fall back to _format_time.
+
+        Args:
+            minutes: Integer array of minutes since midnight
+
+        Returns:
+            List of time strings in HH:MM:SS format
+        """
+        time_strings = _TIME_STRINGS
+        if minutes.size and 0 <= minutes.min() and minutes.max() < len(time_strings):
+            return [time_strings[m] for m in minutes.tolist()]
+
+        return [self._format_time(m) for m in minutes.tolist()]
+
     def generate_calendar_txt(self):
         """Generate calendar.txt file with service periods."""
         print("\nGenerating calendar.txt...")
@@ -280,7 +534,7 @@ class GTFSGenerator:
             end_date
         ]]
 
-        self._write_csv("calendar.txt", headers, rows)
+        self._write_small_csv("calendar.txt", headers, rows)
 
     def generate_feed_info_txt(self):
         """Generate feed_info.txt file."""
@@ -307,7 +561,7 @@ class GTFSGenerator:
             "https://www.lta.gov.sg/content/ltagov/en/contact_us.html"  # Contact URL
         ]]
 
-        self._write_csv("feed_info.txt", headers, rows)
+        self._write_small_csv("feed_info.txt", headers, rows)
 
     def generate_gtfs_feed(
         self,
@@ -4,11 +4,19 @@
 import os
 import sys
 import subprocess
+import tempfile
+import time
 import zipfile
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 import requests
 
+# Read size for streaming the validator jar download
+DOWNLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# Time limit for a canonical validator run, in seconds
+CANONICAL_VALIDATOR_TIMEOUT = 300  # 5 minutes
+
 
 class GTFSValidator:
     """Validator for GTFS feeds."""
@@ -61,18 +69,16 @@ class GTFSValidator:
             self._add_error(f"GTFS path does not exist: {self.gtfs_path}")
             return False
 
-        # Get list of files in directory
+        # Get set of files in directory
         if self.gtfs_path.is_dir():
-            files = [f.name for f in self.gtfs_path.glob("*.txt")]
+            with os.scandir(self.gtfs_path) as entries:
+                files = {e.name for e in entries if e.name.endswith(".txt") and e.is_file()}
         else:
             self._add_error("GTFS path must be a directory")
             return False
 
         # Check required files
-        missing_required = []
-        for required_file in required_files:
-            if required_file not in files:
-                missing_required.append(required_file)
+        missing_required = [f for f in required_files if f not in files]
 
         if missing_required:
             for file in missing_required:
@@ -139,36 +145,36 @@ class GTFSValidator:
             feed: gtfs-kit Feed object
             results: Dictionary to store results
         """
-        # Check for stops without coordinates
+        # Check for stops without coordinates (count the mask directly rather
+        # than materializing the filtered rows)
         if feed.stops is not None:
-            invalid_coords = feed.stops[
-                (feed.stops["stop_lat"].isna()) |
-                (feed.stops["stop_lon"].isna())
-            ]
-            if len(invalid_coords) > 0:
-                msg = f"Found {len(invalid_coords)} stops with missing coordinates"
+            invalid_coords = int(
+                (feed.stops["stop_lat"].isna() | feed.stops["stop_lon"].isna()).sum()
+            )
+            if invalid_coords > 0:
+                msg = f"Found {invalid_coords} stops with missing coordinates"
                 self._add_warning(msg)
                 results["issues"].append(msg)
 
-        # Check for trips without stop_times
+        # Check for trips without stop_times (isin keeps the membership test
+        # in pandas instead of building Python sets of every ID, and hashes
+        # the referencing column directly, so no unique() pass is needed)
         if feed.trips is not None and feed.stop_times is not None:
-            trip_ids_with_stops = set(feed.stop_times["trip_id"].unique())
-            trip_ids_all = set(feed.trips["trip_id"].unique())
-            trips_without_stops = trip_ids_all - trip_ids_with_stops
+            trip_ids = feed.trips["trip_id"]
+            trips_without_stops = trip_ids[~trip_ids.isin(feed.stop_times["trip_id"])].nunique()
 
             if trips_without_stops:
-                msg = f"Found {len(trips_without_stops)} trips without stop_times"
+                msg = f"Found {trips_without_stops} trips without stop_times"
                 self._add_warning(msg)
                 results["issues"].append(msg)
 
         # Check for routes without trips
         if feed.routes is not None and feed.trips is not None:
-            route_ids_with_trips = set(feed.trips["route_id"].unique())
-            route_ids_all = set(feed.routes["route_id"].unique())
-            routes_without_trips = route_ids_all - route_ids_with_trips
+            route_ids = feed.routes["route_id"]
+            routes_without_trips = route_ids[~route_ids.isin(feed.trips["route_id"])].nunique()
 
             if routes_without_trips:
-                msg = f"Found {len(routes_without_trips)} routes without trips"
+                msg = f"Found {routes_without_trips} routes without trips"
                 self._add_warning(msg)
                 results["issues"].append(msg)
 
@@ -191,6 +197,30 @@ class GTFSValidator:
         Returns:
             True if validation succeeded
         """
+        run = self.start_canonical_validator(validator_jar, country_code, output_dir)
+        return self.finish_canonical_validator(run)
+
+    def start_canonical_validator(
+        self,
+        validator_jar: Optional[str] = None,
+        country_code: str = "sg",
+        output_dir: str = "validation_output"
+    ) -> Optional[Dict[str, Any]]:
+        """Start the canonical MobilityData GTFS validator in the background.
+
+        The Java process keeps running while the caller does other work
+        (e.g. validate_with_gtfs_kit); pass the returned handle to
+        finish_canonical_validator to wait for it and check the report.
+
+        Args:
+            validator_jar: Path to gtfs-validator CLI jar file
+            country_code: Two-letter country code (ISO 3166-1 alpha-2)
+            output_dir: Output directory for validation results
+
+        Returns:
+            Handle for finish_canonical_validator, or None if the validator
+            could not be started
+        """
         print("\n🔍 Running canonical GTFS validator...")
 
         # Check if validator jar exists
@@ -204,7 +234,7 @@ class GTFSValidator:
             print("   2. Download the latest gtfs-validator-X.X.X-cli.jar")
             print("   3. Save it as 'gtfs-validator.jar' in this directory")
             print("\n   Or use the web validator at: https://gtfs-validator.mobilitydata.org/")
-            return False
+            return None
 
         # Check if Java is installed
         try:
@@ -216,22 +246,25 @@ class GTFSValidator:
             )
             if result.returncode != 0:
                 print("⚠️  Java not found. Please install Java 17 or higher.")
-                return False
+                return None
         except Exception as e:
             print(f"⚠️  Error checking Java: {e}")
-            return False
+            return None
 
         # Zip the GTFS directory if it's not already zipped
         gtfs_zip = self.gtfs_path
         temp_zip = False
 
         if self.gtfs_path.is_dir():
-            gtfs_zip = Path("temp_gtfs.zip")
+            # Build the zip in the system temp directory rather than the CWD
+            with tempfile.NamedTemporaryFile(suffix=".zip", prefix="gtfs_", delete=False) as tmp:
+                gtfs_zip = Path(tmp.name)
             print(f"  Creating temporary zip file: {gtfs_zip}")
             self._create_zip(self.gtfs_path, gtfs_zip)
             temp_zip = True
 
-        # Run the validator
+        # Start the validator
+        stderr_file = None
         try:
             os.makedirs(output_dir, exist_ok=True)
 
@@ -250,17 +283,57 @@ class GTFSValidator:
             print(f"  Running: {' '.join(cmd)}")
             print(f"  Output will be saved to: {output_dir}")
 
-            result = subprocess.run(
+            # Collect stderr in a temp file rather than a pipe, so a chatty
+            # validator can never block on a full pipe while we are busy
+            stderr_file = tempfile.TemporaryFile(mode="w+")
+            process = subprocess.Popen(
                 cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minutes
+                stdout=subprocess.DEVNULL,
+                stderr=stderr_file,
+                text=True
             )
+        except Exception as e:
+            print(f"\n❌ Error running validator: {e}")
+            if stderr_file is not None:
+                stderr_file.close()
+            if temp_zip and gtfs_zip.exists():
+                gtfs_zip.unlink()
+            return None
+
+        return {
+            "process": process,
+            "stderr_file": stderr_file,
+            "started_at": time.monotonic(),
+            "output_dir": output_dir,
+            "gtfs_zip": gtfs_zip,
+            "temp_zip": temp_zip
+        }
+
+    def finish_canonical_validator(self, run: Optional[Dict[str, Any]]) -> bool:
+        """Wait for a validator started by start_canonical_validator and check its report.
+
+        Args:
+            run: Handle returned by start_canonical_validator (None if it
+                could not be started)
+
+        Returns:
+            True if validation succeeded
+        """
+        if run is None:
+            return False
+
+        process = run["process"]
+        output_dir = run["output_dir"]
+
+        try:
+            # 5 minutes in total, counted from when the validator was started
+            remaining = CANONICAL_VALIDATOR_TIMEOUT - (time.monotonic() - run["started_at"])
+            returncode = process.wait(timeout=max(remaining, 0))
 
             # Check the validation report for errors
             report_json = Path(output_dir) / "report.json"
 
-            if result.returncode == 0 and report_json.exists():
+            if returncode == 0 and report_json.exists():
                 # Parse the report to check for actual validation errors
                 import json
                 try:
@@ -288,7 +361,7 @@ class GTFSValidator:
                 except json.JSONDecodeError as e:
                     print(f"\n⚠️  Could not parse validation report: {e}")
                     return False
-            elif result.returncode == 0:
+            elif returncode == 0:
                 print("\n✅ Canonical validation completed!")
                 print(f"📄 Validation report: {output_dir}/report.html")
                 self._add_info("Canonical validation completed")
@@ -296,30 +369,38 @@ class GTFSValidator:
             else:
                 print(f"\n⚠️  Validation process failed")
                 print(f"📄 See detailed report: {output_dir}/report.html")
-                if result.stderr:
-                    print(f"Error output: {result.stderr}")
+                run["stderr_file"].seek(0)
+                stderr = run["stderr_file"].read()
+                if stderr:
+                    print(f"Error output: {stderr}")
                 self._add_error("Canonical validator process failed")
                 return False
 
         except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
             print("\n⚠️  Validation timed out after 5 minutes")
             return False
         except Exception as e:
             print(f"\n❌ Error running validator: {e}")
             return False
         finally:
+            run["stderr_file"].close()
             # Clean up temporary zip
-            if temp_zip and gtfs_zip.exists():
-                gtfs_zip.unlink()
+            if run["temp_zip"] and run["gtfs_zip"].exists():
+                run["gtfs_zip"].unlink()
 
     def _create_zip(self, source_dir: Path, output_zip: Path):
         """Create a zip file from a directory.
 
+        Members are stored uncompressed: the zip only exists to hand the feed
+        to the validator, so DEFLATE would just burn CPU on stop_times.txt.
+
         Args:
             source_dir: Source directory
             output_zip: Output zip file path
         """
-        with zipfile.ZipFile(output_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        with zipfile.ZipFile(output_zip, 'w', zipfile.ZIP_STORED) as zipf:
             for file in source_dir.glob("*.txt"):
                 zipf.write(file, file.name)
 
@@ -367,15 +448,19 @@ class GTFSValidator:
 
                 total_size = int(response.headers.get('content-length', 0))
                 downloaded = 0
+                last_percent = -1
 
-                with open(output_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
+                with open(output_path, 'wb', buffering=DOWNLOAD_CHUNK_SIZE) as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
                         if chunk:
                             f.write(chunk)
                             downloaded += len(chunk)
                             if total_size > 0:
-                                percent = (downloaded / total_size) * 100
-                                print(f"\r  Progress: {percent:.1f}%", end="", flush=True)
+                                # Only redraw when the whole percentage changes
+                                percent = downloaded * 100 // total_size
+                                if percent != last_percent:
+                                    last_percent = percent
+                                    print(f"\r  Progress: {percent}%", end="", flush=True)
 
                 print(f"\n✅ Downloaded successfully: {output_path}")
                 print(f"   Size: {downloaded / (1024*1024):.1f} MB")
@@ -480,16 +565,21 @@ def main():
         print("\n❌ Basic structure validation failed")
         sys.exit(1)
 
+    # Canonical validator (if requested), started first so the JVM runs
+    # alongside the gtfs-kit checks
+    canonical_run = None
+    if args.run_canonical:
+        canonical_run = validator.start_canonical_validator(
+            validator_jar=args.validator_jar,
+            country_code=args.country
+        )
+
     # gtfs-kit validation
     validator.validate_with_gtfs_kit()
 
-    # Canonical validator (if requested)
     canonical_passed = True
     if args.run_canonical:
-        canonical_passed = validator.run_canonical_validator(
-            validator_jar=args.validator_jar,
-            country_code=args.country
-        )
+        canonical_passed = validator.finish_canonical_validator(canonical_run)
 
     # Print summary
     success = validator.print_summary()
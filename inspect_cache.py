@@ -41,6 +41,13 @@ def main():
             print(f"⚠️  Error reading {cache_name}: {e}")
             print()
 
+    usage = cache.get_sidecar_usage()
+    print(f"🗂  Sidecars (.pkl, .meta.json): {round(usage['sidecar_bytes'] / (1024 * 1024), 2)} MB")
+    print(f"🌐 HTTP revalidation cache ({cache.cache_dir}/http): "
+          f"{usage['http_entries']:,} pages, {round(usage['http_bytes'] / (1024 * 1024), 2)} MB")
+    print()
+    total_size_bytes += usage['sidecar_bytes'] + usage['http_bytes']
+
     total_size_mb = round(total_size_bytes / (1024 * 1024), 2)
     print("=" * 60)
     print(f"Total cache size: {total_size_mb} MB")
@@ -1,35 +1,178 @@
 """Client for LTA DataMall API."""
 
+import json
+import math
 import requests
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Dict, Any, Optional
 import config
-from api_cache import APICache
+from api_cache import APICache, HTTPCache
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to response.json()
+    orjson = None
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting how often requests may start.
+
+    Tokens refill at `rate` per second up to `capacity`, so up to
+    `capacity` requests may start back to back after an idle spell while
+    the sustained rate stays at `rate`. A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        """Initialize the limiter with a full bucket.
+
+        Args:
+            rate: Requests allowed per second on average
+            capacity: Maximum burst of requests
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may start.
+
+        Each caller takes its token under the lock, letting the balance go
+        negative, so concurrent callers queue up behind each other instead
+        of racing for the same refill.
+        """
+        if self.rate <= 0:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate
+
+        if wait > 0:
+            time.sleep(wait)
 
 
 class LTADataMallClient:
     """Client for interacting with LTA DataMall API."""
 
-    def __init__(self, api_key: str = None, use_cache: bool = False, cache_dir: str = "api_cache"):
+    def __init__(
+        self,
+        api_key: str = None,
+        use_cache: bool = False,
+        cache_dir: str = "api_cache",
+        refresh_stale: bool = False
+    ):
         """Initialize the LTA DataMall client.
 
         Args:
             api_key: LTA DataMall API key. If not provided, uses config.LTA_API_KEY
             use_cache: If True, load data from cache instead of making API calls
             cache_dir: Directory to store/load cached API responses
+            refresh_stale: If True (with use_cache), refetch caches older than
+                config.CACHE_TTL_SECONDS and write the fresh data back
         """
         self.api_key = api_key or config.LTA_API_KEY
         self.headers = {
             "AccountKey": self.api_key,
             "accept": "application/json"
         }
-        self.base_delay = 0.5  # Delay between requests to avoid rate limiting
+        self.rate_limiter = RateLimiter(
+            rate=config.REQUESTS_PER_SECOND,
+            capacity=config.REQUEST_BURST
+        )
+
+        # One keep-alive session for all pages, so each request after the
+        # first reuses the TCP/TLS connection instead of handshaking again.
+        # Throttled (429) and transient gateway errors are retried on the
+        # pooled connection, honoring any Retry-After header.
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        retry = Retry(
+            total=config.MAX_REQUEST_RETRIES,
+            backoff_factor=config.RETRY_BACKOFF_FACTOR,
+            status_forcelist=[429, 502, 503, 504],
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self.session.mount(
+            "https://",
+            HTTPAdapter(
+                pool_connections=1,
+                # Room for every endpoint's page window when fetched together
+                pool_maxsize=len(config.ENDPOINTS) * config.MAX_CONCURRENT_REQUESTS,
+                max_retries=retry
+            )
+        )
         self.use_cache = use_cache
+        self.refresh_stale = refresh_stale
         self.cache = APICache(cache_dir=cache_dir)
+        self.http_cache = HTTPCache(cache_dir=cache_dir) if config.HTTP_REVALIDATE else None
+        self._loaded_caches: Dict[str, List[Dict[str, Any]]] = {}
+
+    def close(self):
+        """Close the pooled HTTP connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _is_cache_stale(self, cache_name: str) -> bool:
+        """Check if a cache exists but is past its TTL and can be refreshed.
+
+        Expiry is opt-in via refresh_stale, so plain use_cache runs never
+        call the API for an existing cache. Stale caches are also only
+        refreshed when an API key is available.
+
+        Args:
+            cache_name: Name of the cache (e.g., 'bus_stops')
+
+        Returns:
+            True if the cache should be refetched from the API
+        """
+        if not self.refresh_stale or not self.api_key or not self.cache.exists(cache_name):
+            return False
+        ttl_seconds = config.CACHE_TTL_SECONDS.get(cache_name)
+        return not self.cache.is_fresh(cache_name, ttl_seconds)
+
+    def _load_cache(self, cache_name: str) -> List[Dict[str, Any]]:
+        """Load a cache, parsing each one at most once per client.
+
+        Repeated calls return the same list object, so callers should not
+        modify it in place.
+
+        Args:
+            cache_name: Name of the cache (e.g., 'bus_stops')
+
+        Returns:
+            Cached records
+
+        Raises:
+            FileNotFoundError: If cache file doesn't exist
+        """
+        if cache_name not in self._loaded_caches:
+            self._loaded_caches[cache_name] = self.cache.load(cache_name)
+        return self._loaded_caches[cache_name]
 
     def _make_request(self, url: str, params: Dict = None) -> Dict[str, Any]:
         """Make a request to the LTA DataMall API.
 
+        With config.HTTP_REVALIDATE, a previously stored response is
+        revalidated with a conditional request, and a 304 reply is answered
+        from the stored body instead of downloading it again.
+
         Args:
             url: API endpoint URL
             params: Query parameters
@@ -38,101 +181,209 @@ class LTADataMallClient:
             JSON response as dictionary
         """
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
+            headers = self.http_cache.conditional_headers(url, params) if self.http_cache else None
+            response = self.session.get(url, params=params, headers=headers, timeout=30)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+
+            if response.status_code == 304:
+                body = self.http_cache.load_body(url, params)
+            else:
+                body = response.content
+                if self.http_cache:
+                    self.http_cache.store(url, params, response.headers, body)
+
+            if orjson is not None:
+                return orjson.loads(body)
+            return json.loads(body)
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"Error making request to {url}: {e}")
             raise
 
-    def _fetch_all_pages(self, endpoint_url: str) -> List[Dict[str, Any]]:
-        """Fetch all pages from a paginated endpoint.
+    def _fetch_page(self, endpoint_url: str, skip: int) -> List[Dict[str, Any]]:
+        """Fetch one page of a paginated endpoint.
 
         Args:
             endpoint_url: The API endpoint URL
+            skip: Number of records to skip ($skip)
 
         Returns:
-            List of all records from all pages
+            Records on the page (empty past the last record)
         """
-        all_records = []
-        skip = 0
+        self.rate_limiter.acquire()
 
-        while True:
-            print(f"Fetching records from {endpoint_url} (skip={skip})...")
-            params = {"$skip": skip}
+        params = {"$skip": skip}
 
-            response_data = self._make_request(endpoint_url, params)
-            records = response_data.get("value", [])
+        response_data = self._make_request(endpoint_url, params)
+        return response_data.get("value", [])
 
-            if not records:
-                break
+    def _prefetch_window(self, round_trip_seconds: float) -> int:
+        """Pick how many pages to keep in flight after timing the first page.
 
-            all_records.extend(records)
-            print(f"  Retrieved {len(records)} records (total: {len(all_records)})")
+        Args:
+            round_trip_seconds: Time taken to fetch the first page
 
-            # Check if there are more records
-            if len(records) < config.RECORDS_PER_PAGE:
-                break
+        Returns:
+            Number of outstanding page requests
+        """
+        rate = self.rate_limiter.rate
+        if rate <= 0:
+            return config.MAX_CONCURRENT_REQUESTS
+        fits = math.ceil(round_trip_seconds * rate)
+        return max(1, min(config.MAX_CONCURRENT_REQUESTS, fits))
 
-            skip += config.RECORDS_PER_PAGE
-            time.sleep(self.base_delay)  # Rate limiting
+    def _fetch_all_pages(self, endpoint_url: str) -> List[Dict[str, Any]]:
+        """Fetch all pages from a paginated endpoint.
 
-        print(f"Total records fetched: {len(all_records)}")
-        return all_records
+        The first page is fetched on its own. If it is full, a sliding window
+        of speculative requests for the following pages is kept in flight:
+        pages are consumed in order, and each consumed page is replaced by a
+        request for the next unrequested one, until a short or empty page
+        marks the end. The window is the number of requests the sustained
+        rate limit allows to start during one round trip of the first page
+        (at most config.MAX_CONCURRENT_REQUESTS): when responses arrive faster
+        than the rate limit admits requests, pages are fetched one at a time,
+        and no speculative requests are spent past the end.
+
+        With config.REQUEST_RECORD_COUNT, the first request also asks for
+        the OData record count. If the response carries @odata.count, the
+        remaining pages are all known in advance: the window opens to
+        config.MAX_CONCURRENT_REQUESTS and no request is made past the last
+        record, even when the total is an exact multiple of the page size.
 
-    def get_bus_stops(self, save_cache: bool = False) -> List[Dict[str, Any]]:
-        """Fetch all bus stops.
+        Args:
+            endpoint_url: The API endpoint URL
+
+        Returns:
+            List of all records from all pages
+        """
+        # One line per endpoint rather than per page: with get_all several
+        # endpoints page concurrently and per-page lines would interleave
+        print(f"Fetching records from {endpoint_url}...")
+
+        # Keep each page's list as-is and flatten once at the end, instead of
+        # regrowing one big list page by page
+        pages = []
+        total_records = 0
+
+        params = {"$skip": 0}
+        if config.REQUEST_RECORD_COUNT:
+            params["$count"] = "true"
+
+        # Time only the round trip, not the wait for a rate-limit slot
+        self.rate_limiter.acquire()
+        started = time.monotonic()
+        response_data = self._make_request(endpoint_url, params)
+        records = response_data.get("value", [])
+        record_count = response_data.get("@odata.count")
+
+        if record_count is None:
+            window = self._prefetch_window(time.monotonic() - started)
+        else:
+            # Every remaining offset is known to hold records, so none of
+            # the window is speculative
+            record_count = int(record_count)
+            window = config.MAX_CONCURRENT_REQUESTS
+        next_skip = config.RECORDS_PER_PAGE
+        in_flight = deque()
+
+        with ThreadPoolExecutor(max_workers=config.MAX_CONCURRENT_REQUESTS) as executor:
+            while True:
+                page_size = len(records)
+
+                if page_size:
+                    pages.append(records)
+                    total_records += page_size
+
+                # Check if there are more records
+                if page_size < config.RECORDS_PER_PAGE:
+                    break
+                if record_count is not None and total_records >= record_count:
+                    break
+
+                while len(in_flight) < window and (record_count is None or next_skip < record_count):
+                    in_flight.append(executor.submit(self._fetch_page, endpoint_url, next_skip))
+                    next_skip += config.RECORDS_PER_PAGE
+
+                if not in_flight:
+                    break
+
+                records = in_flight.popleft().result()
+
+            # Drop speculative requests past the end that have not started yet
+            for future in in_flight:
+                future.cancel()
+
+        print(f"Fetched {total_records} records in {len(pages)} pages from {endpoint_url}")
+        return list(chain.from_iterable(pages))
+
+    def _fetch_dataset(self, name: str, save_cache: bool = False) -> List[Dict[str, Any]]:
+        """Fetch one DataMall dataset from cache or the API.
 
         Args:
+            name: Dataset name, a key of config.ENDPOINTS (e.g., 'bus_stops')
             save_cache: If True, save the API response to cache
 
         Returns:
-            List of bus stop dictionaries
+            List of record dictionaries
         """
-        print("\n=== Fetching Bus Stops ===")
+        print(f"\n=== Fetching {name.replace('_', ' ').title()} ===")
 
-        if self.use_cache:
+        if self.use_cache and self._is_cache_stale(name):
+            print("Cache is older than its TTL, fetching from API...")
+            try:
+                data = self._fetch_all_pages(config.ENDPOINTS[name])
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # Keep offline --use-cache runs working from the cached copy
+                print(f"Warning: refresh failed ({e}), using stale cache...")
+                return self._load_cache(name)
+
+            if not data:
+                print("Warning: API returned no records, keeping stale cache...")
+                return self._load_cache(name)
+
+            # Refresh the cache so later runs do not refetch it again
+            print("Saving to cache...")
+            self.cache.save(name, data)
+            self._loaded_caches[name] = data
+            return data
+        elif self.use_cache:
             try:
                 print("Loading from cache...")
-                return self.cache.load("bus_stops")
+                return self._load_cache(name)
             except FileNotFoundError:
+                # Only this dataset falls back to the API; get_all runs the
+                # datasets concurrently, so the shared use_cache flag is left alone
                 print("Cache not found, fetching from API...")
-                self.use_cache = False
 
-        data = self._fetch_all_pages(config.ENDPOINTS["bus_stops"])
+        data = self._fetch_all_pages(config.ENDPOINTS[name])
 
         if save_cache:
             print("Saving to cache...")
-            self.cache.save("bus_stops", data)
+            self.cache.save(name, data)
 
         return data
 
-    def get_bus_services(self, save_cache: bool = False) -> List[Dict[str, Any]]:
-        """Fetch all bus services.
+    def get_bus_stops(self, save_cache: bool = False) -> List[Dict[str, Any]]:
+        """Fetch all bus stops.
 
         Args:
             save_cache: If True, save the API response to cache
 
         Returns:
-            List of bus service dictionaries
+            List of bus stop dictionaries
         """
-        print("\n=== Fetching Bus Services ===")
-
-        if self.use_cache:
-            try:
-                print("Loading from cache...")
-                return self.cache.load("bus_services")
-            except FileNotFoundError:
-                print("Cache not found, fetching from API...")
-                self.use_cache = False
+        return self._fetch_dataset("bus_stops", save_cache)
 
-        data = self._fetch_all_pages(config.ENDPOINTS["bus_services"])
+    def get_bus_services(self, save_cache: bool = False) -> List[Dict[str, Any]]:
+        """Fetch all bus services.
 
-        if save_cache:
-            print("Saving to cache...")
-            self.cache.save("bus_services", data)
+        Args:
+            save_cache: If True, save the API response to cache
 
-        return data
+        Returns:
+            List of bus service dictionaries
+        """
+        return self._fetch_dataset("bus_services", save_cache)
 
     def get_bus_routes(self, save_cache: bool = False) -> List[Dict[str, Any]]:
         """Fetch all bus routes.
@@ -143,20 +394,27 @@ class LTADataMallClient:
         Returns:
             List of bus route dictionaries (each route-stop combination)
         """
-        print("\n=== Fetching Bus Routes ===")
+        return self._fetch_dataset("bus_routes", save_cache)
 
-        if self.use_cache:
-            try:
-                print("Loading from cache...")
-                return self.cache.load("bus_routes")
-            except FileNotFoundError:
-                print("Cache not found, fetching from API...")
-                self.use_cache = False
+    def get_all(self, save_cache: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Fetch every dataset in config.ENDPOINTS concurrently.
 
-        data = self._fetch_all_pages(config.ENDPOINTS["bus_routes"])
+        The endpoints are independent, so their page fetches overlap; all of
+        them still share this client's rate limiter.
 
-        if save_cache:
-            print("Saving to cache...")
-            self.cache.save("bus_routes", data)
+        Args:
+            save_cache: If True, save each API response to cache
 
-        return data
+        Returns:
+            Dictionary mapping dataset name (e.g., 'bus_stops') to its records
+        """
+        with ThreadPoolExecutor(max_workers=len(config.ENDPOINTS)) as executor:
+            futures = {
+                executor.submit(self._fetch_dataset, name, save_cache): name
+                for name in config.ENDPOINTS
+            }
+            results = {}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+        return {name: results[name] for name in config.ENDPOINTS}